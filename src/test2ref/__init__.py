@@ -56,19 +56,23 @@ API
 
 """
 
+import filecmp
 import os
 import re
-import subprocess
 from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from difflib import unified_diff
+from fnmatch import translate
+from functools import lru_cache
 from pathlib import Path
-from shutil import copytree, ignore_patterns, rmtree
+from shutil import copy2, copymode, rmtree
 from tempfile import TemporaryDirectory
 from typing import Any, TypeAlias
 
-from binaryornot.check import is_binary
-
 PRJ_PATH = Path.cwd()
 
+_SEP_TRANS = bytes.maketrans(os.path.sep.encode("utf-8"), b"/")
+
 Search: TypeAlias = Path | str | re.Pattern
 """
 Possible Search Pattern.
@@ -83,11 +87,19 @@ Replacements - Pairs of Search Pattern and Things to be Replaced.
 
 StrReplacements: TypeAlias = Iterable[tuple[str, str]]
 Excludes: TypeAlias = tuple[str, ...]
+Replacer: TypeAlias = tuple["re.Pattern[bytes]", Callable]
+Replacers: TypeAlias = tuple[Replacer, ...]
+
+_BYTES_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL | re.VERBOSE
+_INLINE_FLAGS = ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"), (re.VERBOSE, "x"))
+_STANDALONE_RE = re.compile(r"\\[1-9]|\(\?P[=<]|\(\?\(")
 
 
 DEFAULT_REF_PATH: Path = PRJ_PATH / "tests" / "refdata"
 DEFAULT_REF_UPDATE: bool = (PRJ_PATH / ".test2ref").exists()
 DEFAULT_EXCLUDES: Excludes = ("__pycache__", ".*cache")
+MAX_DIFF_LINES: int = 200
+"""Maximum Number of Diff Lines Reported on Mismatch."""
 CONFIG = {
     "ref_path": DEFAULT_REF_PATH,
     "ref_update": DEFAULT_REF_UPDATE,
@@ -176,37 +188,52 @@ def assert_refdata(
     rplcs: Replacements = replacements or ()  # type: ignore[assignment]
     path_rplcs: StrReplacements = [(srch, rplc) for srch, rplc in rplcs if isinstance(srch, str)]
     gen_rplcs: Replacements = [(PRJ_PATH, "$PRJ"), (path, "$GEN"), *rplcs]
-    gen_excludes: Excludes = (*CONFIG["excludes"], *(excludes or []))
-
-    with TemporaryDirectory() as temp_dir:
-        gen_path = Path(temp_dir)
-
-        ignore = ignore_patterns(*gen_excludes)
-        copytree(path, gen_path, dirs_exist_ok=True, ignore=ignore)
+    exclude_re = _compile_excludes((*CONFIG["excludes"], *(excludes or [])))
+    replacers = _create_replacer(tuple(gen_rplcs))
+
+    if CONFIG["ref_update"]:
+        # Learning Mode: process straight into the reference folder, no temporary copy needed.
+        rmtree(ref_path, ignore_errors=True)
+        ref_path.mkdir(parents=True)
+        _generate(path, ref_path, replacers, path_rplcs, exclude_re, capsys=capsys, caplog=caplog, hardlink=False)
+    else:
+        with TemporaryDirectory() as temp_dir:
+            gen_path = Path(temp_dir)
+            _generate(path, gen_path, replacers, path_rplcs, exclude_re, capsys=capsys, caplog=caplog)
+            assert_paths(ref_path, gen_path, excludes=excludes)
 
-        _replace_path(gen_path, path_rplcs)
 
-        if capsys:
-            captured = capsys.readouterr()
-            (gen_path / "stdout.txt").write_text(captured.out)
-            (gen_path / "stderr.txt").write_text(captured.err)
+def _generate(  # pylint: disable=too-many-arguments
+    src_path: Path,
+    dst_path: Path,
+    replacers: Replacers | None,
+    path_rplcs: StrReplacements,
+    exclude_re: "re.Pattern[str] | None",
+    *,
+    capsys: Any,
+    caplog: Any,
+    hardlink: bool = True,
+):
+    """Create the processed variant of ``src_path`` at ``dst_path``."""
+    if capsys:
+        captured = capsys.readouterr()
+    if caplog:
+        records = list(caplog.records)
+        caplog.clear()
 
-        if caplog:
-            logpath = gen_path / "logging.txt"
-            with logpath.open("w", encoding="utf-8") as file:
-                for record in caplog.records:
-                    file.write(f"{record.levelname:7s}  {record.name}  {record.message}\n")
-            caplog.clear()
+    _copy_tree(src_path, dst_path, replacers, exclude_re, hardlink=hardlink)
 
-        _remove_empty_dirs(gen_path)
+    _replace_path(dst_path, path_rplcs)
 
-        _replace_content(gen_path, gen_rplcs)
+    if capsys:
+        (dst_path / "stdout.txt").write_text(_replace_text(captured.out, replacers))
+        (dst_path / "stderr.txt").write_text(_replace_text(captured.err, replacers))
 
-        if CONFIG["ref_update"]:
-            rmtree(ref_path, ignore_errors=True)
-            copytree(gen_path, ref_path)
+    if caplog:
+        text = "".join(f"{record.levelname:7s}  {record.name}  {record.message}\n" for record in records)
+        (dst_path / "logging.txt").write_text(_replace_text(text, replacers))
 
-        assert_paths(ref_path, gen_path, excludes=excludes)
+    _remove_empty_dirs(dst_path)
 
 
 def assert_paths(ref_path: Path, gen_path: Path, excludes: Iterable[str] | None = None):
@@ -220,81 +247,243 @@ def assert_paths(ref_path: Path, gen_path: Path, excludes: Iterable[str] | None
     Keyword Args:
         excludes: Files and directories to be excluded.
     """
-    diff_excludes: Excludes = (*CONFIG["excludes"], *(excludes or []))
+    exclude_re = _compile_excludes((*CONFIG["excludes"], *(excludes or [])))
+    diffs: list[str] = []
+    _compare_paths(ref_path, gen_path, exclude_re, diffs)
+    if diffs:
+        if len(diffs) > MAX_DIFF_LINES:
+            diffs = [*diffs[:MAX_DIFF_LINES], "... (diff truncated)\n"]
+        raise AssertionError("".join(diffs))
+
+
+def _compare_paths(ref_path: Path, gen_path: Path, exclude_re: "re.Pattern[str] | None", diffs: list[str]):
+    """Compare ``ref_path`` with ``gen_path`` and track mismatches in ``diffs``."""
+    if len(diffs) > MAX_DIFF_LINES:
+        return
+    # `ignore=[]` - the configured excludes are handled via `exclude_re`, not `filecmp.DEFAULT_IGNORES`
+    dcmp = filecmp.dircmp(ref_path, gen_path, ignore=[])
+    diffs.extend(f"Only in {ref_path}: {name}\n" for name in dcmp.left_only if not _is_excluded(name, exclude_re))
+    diffs.extend(f"Only in {gen_path}: {name}\n" for name in dcmp.right_only if not _is_excluded(name, exclude_re))
+    diffs.extend(
+        f"Mismatch between {ref_path / name} and {gen_path / name}\n"
+        for name in dcmp.common_funny
+        if not _is_excluded(name, exclude_re)
+    )
+    for name in (*dcmp.common_files, *dcmp.funny_files):
+        if _is_excluded(name, exclude_re):
+            continue
+        ref_file = ref_path / name
+        gen_file = gen_path / name
+        if not filecmp.cmp(ref_file, gen_file, shallow=False):
+            _diff_files(ref_file, gen_file, diffs)
+    for name in dcmp.common_dirs:
+        if not _is_excluded(name, exclude_re):
+            _compare_paths(ref_path / name, gen_path / name, exclude_re, diffs)
+
+
+def _diff_files(ref_file: Path, gen_file: Path, diffs: list[str]):
+    """Create Unified Diff between ``ref_file`` and ``gen_file`` and track it in ``diffs``."""
     try:
-        cmd = ["diff", "-ru", str(ref_path), str(gen_path)]
-        for exclude in diff_excludes:
-            cmd.extend(("--exclude", exclude))
-        subprocess.run(cmd, check=True, capture_output=True)  # noqa: S603
-    except subprocess.CalledProcessError as error:
-        raise AssertionError(error.stdout.decode("utf-8")) from None
+        ref_lines = ref_file.read_text().splitlines(keepends=True)
+        gen_lines = gen_file.read_text().splitlines(keepends=True)
+    except UnicodeDecodeError:
+        diffs.append(f"Binary files {ref_file} and {gen_file} differ\n")
+        return
+    diffs.extend(unified_diff(ref_lines, gen_lines, fromfile=str(ref_file), tofile=str(gen_file)))
+
+
+def _compile_excludes(excludes: Excludes) -> "re.Pattern[str] | None":
+    """Compile fnmatch patterns in ``excludes`` into a single Regular Expression."""
+    if not excludes:
+        return None
+    return re.compile("|".join(translate(pattern) for pattern in excludes))
+
+
+def _is_excluded(name: str, exclude_re: "re.Pattern[str] | None") -> bool:
+    """Determine whether ``name`` matches the compiled exclude pattern."""
+    return bool(exclude_re and exclude_re.match(name))
+
+
+def _copy_tree(
+    src_path: Path,
+    dst_path: Path,
+    replacers: Replacers | None,
+    exclude_re: "re.Pattern[str] | None",
+    *,
+    hardlink: bool,
+):
+    """Copy ``src_path`` to ``dst_path`` in a single pass, applying ``replacers`` to text files."""
+    src_top = str(src_path)
+    dst_top = str(dst_path)
+    join = os.path.join
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = []
+        # `followlinks` - symlinked directories are materialized, like `copytree(symlinks=False)` did
+        for root, dirs, files in os.walk(src_top, followlinks=True):
+            dirs[:] = [name for name in dirs if not _is_excluded(name, exclude_re)]
+            dst_root = dst_top + root[len(src_top) :]
+            for name in dirs:
+                os.makedirs(join(dst_root, name), exist_ok=True)  # noqa: PTH103
+            for name in files:
+                if _is_excluded(name, exclude_re):
+                    continue
+                futures.append(
+                    executor.submit(_copy_file, join(root, name), join(dst_root, name), replacers, hardlink=hardlink)
+                )
+        for future in as_completed(futures):
+            future.result()
+
+
+def _copy_file(src_file: str, dst_file: str, replacers: Replacers | None, *, hardlink: bool):
+    """Copy ``src_file`` to ``dst_file``, applying ``replacers`` if the content is text."""
+    if replacers:
+        with open(src_file, "rb", buffering=0) as file:  # noqa: PTH123
+            chunk = file.read(8192)
+            if not _is_binary(chunk):
+                content = _replace_bytes(chunk + file.read(), replacers)
+                with open(dst_file, "wb") as out:  # noqa: PTH123
+                    out.write(content)
+                copymode(src_file, dst_file)
+                return
+    # binary (or replacement-free) passthrough - no need to touch the payload
+    if hardlink:
+        # only into the throw-away compare tree - reference files must not share inodes
+        try:
+            os.link(src_file, dst_file)
+        except OSError:
+            copy2(src_file, dst_file)
+        return
+    copy2(src_file, dst_file)
+
+
+def _is_binary(content: bytes) -> bool:
+    """Determine whether ``content`` is binary, using the same NUL-byte heuristic as git."""
+    return b"\x00" in content[:8192]
+
+
+def _replace_bytes(content: bytes, replacers: Replacers | None) -> bytes:
+    """Apply ``replacers`` to ``content``."""
+    for regex, func in replacers or ():
+        content = regex.sub(func, content)
+    return content
+
+
+def _replace_text(text: str, replacers: Replacers | None) -> str:
+    """Apply ``replacers`` to ``text``."""
+    if not replacers:
+        return text
+    return _replace_bytes(text.encode("utf-8"), replacers).decode("utf-8")
 
 
 def _remove_empty_dirs(path: Path):
     """Remove Empty Directories within ``path``."""
-    for sub_path in tuple(path.glob("**/*")):
-        if not sub_path.exists() or not sub_path.is_dir():
+    top = str(path)
+    for root, _, _ in os.walk(path, topdown=False):
+        if root == top:
             continue
-        sub_dir = sub_path
-        while sub_dir != path:
-            is_empty = not any(sub_dir.iterdir())
-            if is_empty:
-                sub_dir.rmdir()
-                sub_dir = sub_dir.parent
-            else:
-                break
+        try:
+            os.rmdir(root)  # noqa: PTH106
+        except OSError:
+            pass  # not empty
 
 
 def _replace_path(path: Path, replacements: StrReplacements):
-    paths = [path]
-    while paths:
-        path = paths.pop()
-        orig = name = path.name
-        for srch, rplc in replacements:
-            name = name.replace(srch, rplc)
-        if orig != name:
-            path = path.replace(path.with_name(name))
-        if path.is_dir():
-            paths.extend(path.iterdir())
-
-
-def _replace_content(path: Path, replacements: Replacements):
-    """Replace ``replacements`` for text files in ``path``."""
-    # pre-compile regexs and create substitution functions
-    regex_funcs = [_create_regex_func(search, replace) for search, replace in replacements]
-    # search files and replace
-    for sub_path in tuple(path.glob("**/*")):
-        if not sub_path.is_file() or is_binary(str(sub_path)):
+    """Apply ``replacements`` to all file and directory names within ``path``."""
+    if not replacements:
+        return
+    # bottom-up, so renamed directories do not invalidate pending paths
+    for root, dirs, files in os.walk(path, topdown=False):
+        for orig in (*files, *dirs):
+            name = orig
+            for srch, rplc in replacements:
+                name = name.replace(srch, rplc)
+            if name != orig:
+                os.rename(os.path.join(root, orig), os.path.join(root, name))  # noqa: PTH104, PTH118
+
+
+@lru_cache(maxsize=512)
+def _create_replacer(replacements: tuple[tuple[Search, str], ...]) -> Replacers | None:
+    """Compile ``replacements`` into as few Regular Expression passes as possible."""
+    patterns: list[str] = []
+    funcs: list[Callable] = []
+    replacers: list[Replacer] = []
+    for search, replace in replacements:
+        if isinstance(search, re.Pattern) and _needs_standalone(search.pattern):
+            replacers.append(_create_standalone_replacer(search, replace))
             continue
-        content = sub_path.read_text()
-        total = 0
-        for regex, func in regex_funcs:
-            content, counts = regex.subn(func, content)
-            total += counts
-        if total:
-            sub_path.write_text(content)
+        index = len(patterns)
+        pattern, func = _create_pattern_func(search, replace)
+        patterns.append(f"(?P<g{index}>{pattern})")
+        funcs.append(func)
+    if patterns:
+        regex = re.compile("|".join(patterns).encode("utf-8"))
+        # `re.Match.lastindex` refers to the group of the matching alternative
+        groupfuncs = {regex.groupindex[f"g{index}"]: func for index, func in enumerate(funcs)}
 
+        def func(mat: "re.Match[bytes]") -> bytes:
+            return groupfuncs[mat.lastindex](mat)
 
-def _create_regex_func(search: Search, replace: str) -> tuple[re.Pattern, Callable]:
-    """Create Regular Expression for `search`."""
+        replacers.insert(0, (regex, func))
+    return tuple(replacers) or None
+
+
+def _needs_standalone(pattern: str | bytes) -> bool:
+    """
+    Determine whether ``pattern`` must stay out of the merged alternation.
+
+    Backreferences and conditional references break on group renumbering,
+    named groups may collide with other patterns or the synthetic group names.
+    """
+    if isinstance(pattern, bytes):
+        pattern = pattern.decode("utf-8")
+    return bool(_STANDALONE_RE.search(pattern))
+
+
+def _create_standalone_replacer(search: "re.Pattern", replace: str) -> Replacer:
+    """Compile ``search`` as a standalone pass, preserving its group numbering and names."""
+    pattern = search.pattern
+    if isinstance(pattern, str):
+        pattern = pattern.encode("utf-8")
+    rplc = replace.encode("utf-8")
+    return re.compile(pattern, search.flags & _BYTES_FLAGS), lambda mat: rplc
+
+
+@lru_cache(maxsize=512)
+def _create_pattern_func(search: Search, replace: str) -> tuple[str, Callable]:
+    """
+    Create Raw Regular Expression Pattern for `search`.
+
+    The pattern becomes part of a bytes regular expression, so matching is
+    plain ASCII - no Unicode machinery is involved.
+    """
     if isinstance(search, re.Pattern):
-        return search, lambda mat: replace
+        pattern = search.pattern
+        if isinstance(pattern, bytes):
+            pattern = pattern.decode("utf-8")
+        if flags := _inline_flags(search.flags):
+            pattern = f"(?{flags}:{pattern})"
+        rplc = replace.encode("utf-8")
+        return pattern, lambda mat: rplc
 
     if isinstance(search, Path):
         sep_esc = re.escape(os.path.sep)
         esc = re.escape(str(search))
-        pat = re.compile(rf"{esc}([A-Za-z0-9_{sep_esc}]*)")
-        return pat, _substitute_path(replace)
+        return rf"{esc}([A-Za-z0-9_{sep_esc}]*)", _substitute_path(replace)
+
+    return rf"{re.escape(search)}()", _substitute_path(replace)
+
 
-    return re.compile(rf"{re.escape(search)}()"), _substitute_path(replace)
+def _inline_flags(flags: int) -> str:
+    """Scoped inline flag letters for ``flags``, restricted to flags valid in bytes patterns."""
+    return "".join(char for flag, char in _INLINE_FLAGS if flags & flag)
 
 
 def _substitute_path(replace: str):
     """Factory for Substitution Function."""
+    rplc = replace.encode("utf-8")
 
     def func(mat):
-        sub = mat.group(1)
-        sub = sub.replace(os.path.sep, "/")
-        return f"{replace}{sub}"
+        sub = mat.group(mat.lastindex + 1)
+        return rplc + sub.translate(_SEP_TRANS)
 
     return func
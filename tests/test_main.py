@@ -24,12 +24,15 @@
 """Basic Testing."""
 
 import logging
+import os
 import re
 import sys
+from contextlib import nullcontext
 from pathlib import Path
-from unittest.mock import patch
+from shutil import copytree
+
+from pytest import fixture, mark, raises
 
-from pytest import mark, raises
 from test2ref import (
     CONFIG,
     DEFAULT_EXCLUDES,
@@ -41,34 +44,99 @@ from test2ref import (
     configure,
 )
 
+# All tests share the committed refdata tree and the process-wide CONFIG,
+# so they must stay on one worker when running under pytest-xdist.
+pytestmark = mark.xdist_group("refdata")
+
 LOGGER = logging.getLogger("dummy")
+REFDATA_PATH = Path(__file__).parent.joinpath("refdata", "tests.test_main")
+CONTENT = "Content\n"
+CONTENT_BYTES = CONTENT.encode("utf-8")
+STDOUT_BYTES = b"One\nTwo\n"
+STDERR_BYTES = b"myerr\n"
+LOGGING_BYTES = b"INFO     dummy  loginfo\nWARNING  dummy  logwarn\n"
+BLOB = (
+    b"\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09\x0a\x0b\x0c\x0d\x0e\x0f"
+    b"\x10\x11\x12\x13\x14\x15\x16\x17\x18\x19\x1a\x1b\x1c\x1d\x1e\x1f !\"#$%&'"
+)
+PATH_REPLACEMENTS: Replacements = (
+    ("one", "two"),
+    ("three", "four"),
+)
+OVER_REPLACEMENTS: Replacements = ((re.compile(re.escape("Over")), "RAINBOW"),)
+HELLO_RE = re.compile(r"Hello [A-Za-z]+")
+REPLACE_TMPL = b"Something\n Over Multiple Lines\n With %b/inside\n %b too\n"
 
 
-def test_configure(tmp_path):
-    """Configure."""
-    ref_path = tmp_path / "ref"
+@fixture(autouse=True)
+def _restore_config():
+    """Snapshot `CONFIG` and restore it after each test."""
+    snap = dict(CONFIG)
+    yield
+    CONFIG.clear()
+    CONFIG.update(snap)
 
-    config = {}
-    with patch.dict(CONFIG, config):
-        configure(ref_path=ref_path)
-        assert CONFIG["ref_path"] == ref_path
 
-        configure(ref_update=True)
-        assert CONFIG["ref_update"]
+def _count_tree(path: Path) -> int:
+    """Count all entries below ``path``."""
+    if hasattr(os, "fwalk"):  # POSIX only
+        return sum(len(dirs) + len(files) for _, dirs, files, _ in os.fwalk(path))
+    return sum(len(dirs) + len(files) for _, dirs, files in os.walk(path))
 
-        configure(excludes=("a", "b"))
-        assert CONFIG["excludes"] == ("a", "b")
+
+def test_configure(tmp_path):
+    """Configure."""
+    ref_path = tmp_path / "ref"
 
     assert CONFIG["ref_path"] == DEFAULT_REF_PATH
     assert CONFIG["ref_update"] == DEFAULT_REF_UPDATE
     assert CONFIG["excludes"] == DEFAULT_EXCLUDES
 
+    configure(ref_path=ref_path)
+    assert CONFIG["ref_path"] == ref_path
+
+    configure(ref_update=True)
+    assert CONFIG["ref_update"]
+
+    configure(excludes=("a", "b"))
+    assert CONFIG["excludes"] == ("a", "b")
+
+
+def _mk_dirs(base: Path, rels: tuple[str, ...]):
+    """Create directories ``rels`` below ``base``, deepest chains first."""
+    for rel in rels:
+        base.joinpath(*rel.split("/")).mkdir(parents=True, exist_ok=True)
+
+
+@fixture(scope="session")
+def skeleton(tmp_path_factory) -> Path:
+    """Prebuilt File Tree shared by all `_test` runs."""
+    path = tmp_path_factory.mktemp("skeleton")
+    (path / "file.txt").write_text(CONTENT)
+    (path / "blob").write_bytes(BLOB)
+    _mk_dirs(path, ("some/where/deep", "some/how"))
+    return path
+
 
-def _test(tmp_path: Path):
-    (tmp_path / "file.txt").write_text("Content\n")
-    (tmp_path / "blob").write_bytes(bytes(range(40)))
-    (tmp_path / "some" / "where" / "deep").mkdir(parents=True)
-    (tmp_path / "some" / "how").mkdir(parents=True)
+def _touch_many(base: Path, rels: tuple[str, ...]):
+    """Create empty files ``rels`` below ``base``."""
+    for rel in rels:
+        os.close(os.open(os.path.join(base, *rel.split("/")), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))  # noqa: PTH118
+
+
+def _relset(root: Path) -> frozenset[str]:
+    """Relative paths of all entries below ``root``, one walk instead of one stat per check."""
+    top = str(root)
+    result = set()
+    for dirpath, dirnames, filenames in os.walk(top):
+        rel = os.path.relpath(dirpath, top)
+        for name in (*dirnames, *filenames):
+            result.add(os.path.normpath(os.path.join(rel, name)).replace(os.sep, "/"))  # noqa: PTH118
+    return frozenset(result)
+
+
+def _test(tmp_path: Path, skeleton: Path):
+    copytree(skeleton, tmp_path, dirs_exist_ok=True)
     print("One")
     print("Two")
     print("myerr", file=sys.stderr)
@@ -77,125 +145,114 @@ def _test(tmp_path: Path):
 
 
 @mark.parametrize("fail", (False, True))
-def test_default(tmp_path: Path, fail: bool):
+def test_default(tmp_path: Path, skeleton: Path, fail: bool):
     """Default Behaviour."""
-    _test(tmp_path)
+    _test(tmp_path, skeleton)
     if fail:
         (tmp_path / "file.txt").write_text("Other Content\n")
 
-    if fail:
-        configure(ref_update=False)
-        with raises(AssertionError):
-            assert_refdata(test_default, tmp_path)
-    else:
-        configure(ref_update=True)
+    configure(ref_update=not fail)
+    ctx = raises(AssertionError) if fail else nullcontext()
+    with ctx:
         assert_refdata(test_default, tmp_path)
 
-    ref_path = Path.cwd() / "tests" / "refdata" / "tests.test_main" / "test_default"
-    assert len(tuple(ref_path.glob("**/*"))) == 2
-    assert (ref_path / "file.txt").read_text() == "Content\n"
+    ref_path = REFDATA_PATH / "test_default"
+    assert _count_tree(ref_path) == 2
+    assert (ref_path / "file.txt").read_bytes() == CONTENT_BYTES
+    # learned references are real copies, not hardlinks into tmp_path
+    assert (ref_path / "blob").stat().st_nlink == 1
 
 
 @mark.parametrize("fail", (False, True))
-def test_capsys(tmp_path: Path, capsys, fail: bool):
+def test_capsys(tmp_path: Path, skeleton: Path, capsys, fail: bool):
     """Use of capsys."""
-    _test(tmp_path)
+    _test(tmp_path, skeleton)
     if fail:
         print("addition")
 
-    if fail:
-        configure(ref_update=False)
-        with raises(AssertionError):
-            assert_refdata(test_capsys, tmp_path, capsys=capsys)
-    else:
-        configure(ref_update=True)
+    configure(ref_update=not fail)
+    ctx = raises(AssertionError) if fail else nullcontext()
+    with ctx:
         assert_refdata(test_capsys, tmp_path, capsys=capsys)
 
-    ref_path = Path.cwd() / "tests" / "refdata" / "tests.test_main" / "test_capsys"
-    assert len(tuple(ref_path.glob("**/*"))) == 4
-    assert (ref_path / "file.txt").read_text() == "Content\n"
-    assert (ref_path / "stdout.txt").read_text() == "One\nTwo\n"
-    assert (ref_path / "stderr.txt").read_text() == "myerr\n"
+    ref_path = REFDATA_PATH / "test_capsys"
+    assert _count_tree(ref_path) == 4
+    assert (ref_path / "file.txt").read_bytes() == CONTENT_BYTES
+    assert (ref_path / "stdout.txt").read_bytes() == STDOUT_BYTES
+    assert (ref_path / "stderr.txt").read_bytes() == STDERR_BYTES
 
 
 @mark.parametrize("fail", (False, True))
-def test_caplog(tmp_path: Path, caplog, fail: bool):
+def test_caplog(tmp_path: Path, skeleton: Path, caplog, fail: bool):
     """Use of caplog."""
-    _test(tmp_path)
+    _test(tmp_path, skeleton)
     if fail:
         LOGGER.warning("addition")
 
-    if fail:
-        configure(ref_update=False)
-        with raises(AssertionError):
-            assert_refdata(test_caplog, tmp_path, caplog=caplog)
-    else:
-        configure(ref_update=True)
+    configure(ref_update=not fail)
+    ctx = raises(AssertionError) if fail else nullcontext()
+    with ctx:
         assert_refdata(test_caplog, tmp_path, caplog=caplog)
 
-    ref_path = Path.cwd() / "tests" / "refdata" / "tests.test_main" / "test_caplog"
-    assert len(tuple(ref_path.glob("**/*"))) == 3
-    assert (ref_path / "file.txt").read_text() == "Content\n"
-    assert (ref_path / "logging.txt").read_text() == "INFO     dummy  loginfo\nWARNING  dummy  logwarn\n"
+    ref_path = REFDATA_PATH / "test_caplog"
+    assert _count_tree(ref_path) == 3
+    assert (ref_path / "file.txt").read_bytes() == CONTENT_BYTES
+    assert (ref_path / "logging.txt").read_bytes() == LOGGING_BYTES
 
 
 def test_replace(tmp_path: Path):
     """Test Replacements."""
-    one_path = tmp_path / "one" / "deep"
+    one_path = tmp_path.joinpath("one", "deep")
     other_path = tmp_path / "other"
 
     one_path.mkdir(parents=True)
-    (one_path / "file.txt").write_text(f"Something\n Over Multiple Lines\n With {one_path}/inside\n {other_path} too\n")
+    (one_path / "file.txt").write_bytes(REPLACE_TMPL % (os.fsencode(one_path), os.fsencode(other_path)))
 
     configure(ref_update=False)
-    replacements: Replacements = [
-        (other_path, "$OTHER_PATH"),
-        ("Over", "RAINBOW"),
-    ]
+    replacements: Replacements = [(other_path, "$OTHER_PATH"), *OVER_REPLACEMENTS]
     assert_refdata(test_replace, one_path, replacements=replacements)
 
 
 def test_default_excludes(tmp_path: Path):
     """Text Default Excludes."""
-    (tmp_path / "file.txt").touch()
-    (tmp_path / "__pycache__").mkdir()
-    (tmp_path / "__pycache__" / "file.pyc").touch()
-    (tmp_path / ".tool_cache").mkdir()
-    (tmp_path / ".tool_cache" / "file.pyc").touch()
-    (tmp_path / "sub" / ".tool_cache").mkdir(parents=True)
-    (tmp_path / "sub" / ".tool_cache" / "file.pyc").touch()
-    (tmp_path / "sub" / "__pycache__").mkdir(parents=True)
-    (tmp_path / "sub" / "__pycache__" / "file.txt").touch()
-    (tmp_path / "sub" / ".cache").touch()
+    _mk_dirs(tmp_path, ("__pycache__", ".tool_cache", "sub/.tool_cache", "sub/__pycache__"))
+    _touch_many(
+        tmp_path,
+        (
+            "file.txt",
+            "__pycache__/file.pyc",
+            ".tool_cache/file.pyc",
+            "sub/.tool_cache/file.pyc",
+            "sub/__pycache__/file.txt",
+            "sub/.cache",
+        ),
+    )
 
     configure(ref_update=False)
     assert_refdata(test_default_excludes, tmp_path)
 
-    assert (tmp_path / "file.txt").exists()
-    assert (tmp_path / "__pycache__" / "file.pyc").exists()
-    assert (tmp_path / ".tool_cache" / "file.pyc").exists()
-    assert (tmp_path / "sub" / ".tool_cache" / "file.pyc").exists()
-    assert (tmp_path / "sub" / ".cache").exists()
-
-    ref_path = Path.cwd() / "tests" / "refdata" / "tests.test_main" / "test_default_excludes"
-    assert (ref_path / "file.txt").exists()
-    assert not (ref_path / "__pycache__").exists()
-    assert not (ref_path / ".tool_cache").exists()
-    assert not (ref_path / "sub" / ".tool_cache" / "file.pyc").exists()
-    assert not (ref_path / "sub" / "__pycache__").exists()
-    assert not (ref_path / "sub" / ".cache").exists()
+    tmp_set = _relset(tmp_path)
+    assert "file.txt" in tmp_set
+    assert "__pycache__/file.pyc" in tmp_set
+    assert ".tool_cache/file.pyc" in tmp_set
+    assert "sub/.tool_cache/file.pyc" in tmp_set
+    assert "sub/.cache" in tmp_set
+
+    ref_set = _relset(REFDATA_PATH / "test_default_excludes")
+    assert "file.txt" in ref_set
+    assert "__pycache__" not in ref_set
+    assert ".tool_cache" not in ref_set
+    assert "sub/.tool_cache/file.pyc" not in ref_set
+    assert "sub/__pycache__" not in ref_set
+    assert "sub/.cache" not in ref_set
 
 
 def test_excludes(tmp_path: Path):
     """Text Excludes."""
-    ref_path = Path.cwd() / "tests" / "refdata" / "tests.test_main" / "test_excludes"
+    ref_path = REFDATA_PATH / "test_excludes"
 
-    (tmp_path / "file.txt").touch()
-    (tmp_path / "file.csv").touch()
-    (tmp_path / "__pycache__").mkdir()
-    (tmp_path / "__pycache__" / "file.pyc").touch()
-    (tmp_path / ".tool_cache").mkdir()
-    (tmp_path / ".tool_cache" / "file.pyc").touch()
+    _mk_dirs(tmp_path, ("__pycache__", ".tool_cache"))
+    _touch_many(tmp_path, ("file.txt", "file.csv", "__pycache__/file.pyc", ".tool_cache/file.pyc"))
 
     (ref_path / "__pycache__").mkdir(exist_ok=True)
     (ref_path / "__pycache__" / "file.pyc").touch()
@@ -205,14 +262,51 @@ def test_excludes(tmp_path: Path):
 
     assert (tmp_path / "file.txt").exists()
     assert (tmp_path / "file.csv").exists()
-    assert (tmp_path / "__pycache__" / "file.pyc").exists()
-    assert (tmp_path / ".tool_cache" / "file.pyc").exists()
+    assert tmp_path.joinpath("__pycache__", "file.pyc").exists()
+    assert tmp_path.joinpath(".tool_cache", "file.pyc").exists()
     assert not (ref_path / "file.txt").exists()
     assert (ref_path / "file.csv").exists()
     assert (ref_path / "__pycache__").exists()
     assert not (ref_path / ".tool_cache").exists()
 
 
+def test_filemode(tmp_path):
+    """File Modes are preserved."""
+    ref_path = tmp_path / "ref"
+    gen_path = tmp_path / "gen"
+    gen_path.mkdir()
+
+    script_path = gen_path / "run.sh"
+    script_path.write_text("#!/bin/sh\n")
+    script_path.chmod(0o755)
+    blob_path = gen_path / "blob"
+    blob_path.write_bytes(b"\x00\x01")
+    blob_path.chmod(0o755)
+
+    configure(ref_update=True)
+    assert_refdata(ref_path, gen_path)
+
+    assert (ref_path / "run.sh").stat().st_mode & 0o777 == 0o755
+    assert (ref_path / "blob").stat().st_mode & 0o777 == 0o755
+
+
+def test_symlink_dir(tmp_path):
+    """Symlinked Directories are materialized."""
+    ref_path = tmp_path / "ref"
+    gen_path = tmp_path / "gen"
+    real_path = gen_path / "real"
+    real_path.mkdir(parents=True)
+
+    (real_path / "file.txt").write_text(CONTENT)
+    (gen_path / "link").symlink_to(real_path, target_is_directory=True)
+
+    configure(ref_update=True)
+    assert_refdata(ref_path, gen_path)
+
+    assert (ref_path / "real" / "file.txt").read_text() == CONTENT
+    assert (ref_path / "link" / "file.txt").read_text() == CONTENT
+
+
 def test_assert_paths(tmp_path):
     """Test Assert Paths."""
     ref_path = tmp_path / "ref"
@@ -232,29 +326,40 @@ def test_assert_paths(tmp_path):
     with raises(AssertionError):
         assert_paths(ref_path, other_path)
 
+    # names from `filecmp.DEFAULT_IGNORES` are still compared
+    (ref_path / "tags").write_text("One\n")
+    (one_path / "tags").write_text("Two\n")
+    with raises(AssertionError):
+        assert_paths(ref_path, one_path)
+
+    (one_path / "tags").write_text("One\n")
+    assert_paths(ref_path, one_path)
+
+    # a directory on one side and a file on the other is a mismatch
+    (ref_path / "sub").mkdir()
+    (one_path / "sub").write_text("One\n")
+    with raises(AssertionError):
+        assert_paths(ref_path, one_path)
+
 
 def test_path_replacements(tmp_path):
     """Path Replacements."""
-    replacements = [
-        ("one", "two"),
-        ("three", "four"),
-    ]
-    deep_path = tmp_path / "someone" / "has" / "three" / "dirs"
+    deep_path = tmp_path.joinpath("someone", "has", "three", "dirs")
     deep_path.mkdir(parents=True)
     (deep_path / "file").touch()
     (deep_path / "empty").mkdir()
-    (tmp_path / "someone" / "has" / "three.txt").touch()
+    tmp_path.joinpath("someone", "has", "three.txt").touch()
 
     configure(ref_update=True)
-    assert_refdata(test_path_replacements, tmp_path, replacements=replacements)
+    assert_refdata(test_path_replacements, tmp_path, replacements=PATH_REPLACEMENTS)
 
-    assert (tmp_path / "someone" / "has" / "three" / "dirs" / "file").exists()
-    assert (tmp_path / "someone" / "has" / "three.txt").exists()
+    assert tmp_path.joinpath("someone", "has", "three", "dirs", "file").exists()
+    assert tmp_path.joinpath("someone", "has", "three.txt").exists()
 
-    ref_path = Path.cwd() / "tests" / "refdata" / "tests.test_main" / "test_path_replacements"
-    assert (ref_path / "sometwo" / "has" / "four" / "dirs" / "file").exists()
-    assert (ref_path / "sometwo" / "has" / "four.txt").exists()
-    assert not (ref_path / "sometwo" / "has" / "four" / "dirs" / "empty").exists()
+    ref_path = REFDATA_PATH / "test_path_replacements"
+    assert ref_path.joinpath("sometwo", "has", "four", "dirs", "file").exists()
+    assert ref_path.joinpath("sometwo", "has", "four.txt").exists()
+    assert not ref_path.joinpath("sometwo", "has", "four", "dirs", "empty").exists()
 
 
 def test_path_abs(tmp_path):
@@ -314,7 +419,7 @@ Hello Mars 2
 Hello Venus 3
 """)
 
-    replacements = ((re.compile(r"Hello [A-z]+"), "Hello PLANET"),)
+    replacements = ((HELLO_RE, "Hello PLANET"),)
 
     configure(ref_update=True)
     assert_refdata(ref_path, gen_path, replacements=replacements)
@@ -327,3 +432,40 @@ Hello PLANET 2
 Hello PLANET 3
 """
     )
+
+
+def test_regex_flags(tmp_path):
+    """Regular Expression Flags and Backreferences."""
+    ref_path = tmp_path / "ref"
+    gen_path = tmp_path / "gen"
+    gen_path.mkdir()
+
+    (gen_path / "file.txt").write_text("""\
+Hello WORLD
+abcabc
+name1 name2
+ax
+""")
+
+    replacements = (
+        (re.compile(r"hello \w+", re.IGNORECASE), "HI"),
+        (re.compile(r"(abc)\1"), "TWICE"),
+        # identical group names must not collide with each other
+        (re.compile(r"(?P<a>name)1"), "N1"),
+        (re.compile(r"(?P<a>name)2"), "N2"),
+        # conditional references must keep pointing at their own group
+        (re.compile(r"(a)?(?(1)x|y)"), "COND"),
+    )
+
+    configure(ref_update=True)
+    assert_refdata(ref_path, gen_path, replacements=replacements)
+
+    assert (
+        (ref_path / "file.txt").read_text()
+        == """\
+HI
+TWICE
+N1 N2
+COND
+"""
+    )